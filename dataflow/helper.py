@@ -4,18 +4,32 @@
 # Description:
 #   Helper functions
 ##########################
+import os
 import re
 import sys
+import mmap
 import subprocess
-from typing import Tuple, Optional
+from contextlib import contextmanager
+from typing import Tuple, Optional, List
 from colorlog import getLogger
 from sympy import sympify
 from pyverilog.vparser.ast import ModuleDef
 from pyverilog.vparser.parser import parse as vparse
 
+try:
+    import hyperscan
+except ImportError:  # Optional, falls back to re.
+    hyperscan = None
+
 logger = getLogger("main")
 
-MODULE_REGEX = "^module (\w+)"
+# Declaration keywords, matched at line start only.
+# NOTE: Commented out declarations, such as '// module', never match.
+VERILOG_KEYWORDS = ('module', 'endmodule', 'primitive', 'endprimitive', 'interface', 'endinterface')
+_KEYWORD_PATTERNS = [rb'^[ \t]*' + k.encode() + rb'\b' for k in VERILOG_KEYWORDS]
+_KEYWORD_RE = re.compile(rb'^[ \t]*(' + b'|'.join(k.encode() for k in VERILOG_KEYWORDS) + rb')\b', re.MULTILINE)
+_IDENT_RE = re.compile(rb'\s+(\w+)')
+_KEYWORD_DB = None  # hyperscan database, compiled on first use
 
 def eval_expr(e, base=None, unit=None):
     """Evaluate expression string & remove trailing zeroes."""
@@ -37,6 +51,54 @@ def eval_expr(e, base=None, unit=None):
     else:
         return result
 
+def format_time_ns(t: float) -> str:
+    """Format timestamp with 'ns' unit, such as: 12.5 -> '12.5ns'."""
+    return f"{t}ns"
+
+def format_time_expr(t: float, ident: str) -> str:
+    """
+    Format timestamp offset by a SPICE parameter, such as: (12.5, 'trf') -> 'trf + 12.5ns'.
+
+    Same output as eval_expr(f'{t} + {ident}', base=1, unit='ns'), without sympy.
+    """
+    return f"{ident} + {t}ns"
+
+@contextmanager
+def map_file(filepath: str):
+    """
+    Memory-map input file as read-only bytes, so the kernel pages it in directly.
+
+    An empty file yields b'', since it can not be mapped.
+    """
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+class MappedReader:
+    """
+    Minimal binary stream over a memory-mapped buffer, for readers that only need readinto(),
+    such as pyvcd tokenize.
+    """
+    def __init__(self, buf):
+        self._view = memoryview(buf)
+        self._pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._view.release()  # NOTE: The mmap can not be closed while the view is exported.
+
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
 def run_command(cmd: str, shell: bool = True, timeout: Optional[float] = None) -> Tuple[int, str, str]:
     """Execute a command and return the exit code, stdout, and stderr.
 
@@ -90,19 +152,55 @@ def parse_ast(input_files: list):
 
     raise ValueError("No module found in the Verilog file")
 
+def _keyword_db():
+    global _KEYWORD_DB
+    if _KEYWORD_DB is None:
+        _KEYWORD_DB = hyperscan.Database()
+        _KEYWORD_DB.compile(
+            expressions=_KEYWORD_PATTERNS,
+            ids=list(range(len(_KEYWORD_PATTERNS))),
+            elements=len(_KEYWORD_PATTERNS),
+            flags=[hyperscan.HS_FLAG_MULTILINE] * len(_KEYWORD_PATTERNS)
+        )
+    return _KEYWORD_DB
+
+def scan_keywords(buf) -> List[Tuple[str, int, Optional[str]]]:
+    """
+    Scan verilog source for all VERILOG_KEYWORDS in a single pass, using hyperscan if available.
+
+    Returns (keyword, offset, identifier) in source order, such as: ('module', 6, 'top').
+    Identifier is None for 'end*' keywords.
+    """
+    if hyperscan is not None:
+        events = []
+
+        def on_match(_id, _from, _to, _flags, _context):
+            events.append((_to, VERILOG_KEYWORDS[_id]))
+
+        _keyword_db().scan(buf, match_event_handler=on_match)
+        events.sort()
+    else:
+        events = [(m.end(), m.group(1).decode()) for m in _KEYWORD_RE.finditer(buf)]
+
+    result = []
+    for offset, keyword in events:
+        m = None if keyword.startswith('end') else _IDENT_RE.match(buf, offset)
+        result.append((keyword, offset, m.group(1).decode() if m else None))
+
+    return result
+
 def safe_get_module_top(input_file: str):
     """
-    Temporary workaround.
+    Scan memory-mapped input verilog file, and return the last declared module as top.
 
-    Read input verilog file line by line.
+    Same result as parse_ast(), without building the full AST.
     """
     module_top = None
 
-    with open(input_file, 'r') as f:
-        lines = f.readlines()
-        for line in lines:
-            if re.search(MODULE_REGEX, line):
-                module_top, = re.search(MODULE_REGEX, line).groups()
+    with map_file(input_file) as mm:
+        for keyword, _, name in scan_keywords(mm):
+            if keyword == 'module' and name:
+                module_top = name
 
     if not module_top:
         logger.fatal(f"Failed to parse module top. Exit.")
@@ -7,14 +7,23 @@
 # Description:
 #   Parse VCD file to dataflow
 #################################
-from logging import getLogger
+import re
+from logging import getLogger, DEBUG
 from io import StringIO
 from pyvcd.reader import tokenize, TokenKind, VCDParseError
 from pyvcd.common import VarType
 from dataflow.types import *
+from dataflow.helper import MappedReader
 
 logger = getLogger('main')
 
+_TIMESCALE_RE = re.compile(rb'(\d+)\s*([a-z]+)')  # Such as: 1ps, 10 ns
+
+
+class VCDFormatError(Exception):
+    """Raised by the fast parser on VCD syntax it cannot decode."""
+
+
 class VCDParser:
     def __init__(self):
         self._iter = None
@@ -29,6 +38,20 @@ class VCDParser:
             logger.error(f'Parser Error. {e}', exc_info=True)
             return None
 
+    def parse_fast(self, buf) -> VCDModule:
+        """
+        Parse memory-mapped VCD bytes directly, without allocating a pyvcd Token per record.
+
+        Falls back to the pyvcd tokenizer on malformed input. Errors from the data itself,
+        such as a value wider than its register, are raised as is.
+        """
+        try:
+            return self._parse_fast(buf)
+        except VCDFormatError as e:
+            logger.warning(f'Fast VCD parser failed: {e}. Fallback to pyvcd tokenizer.')
+            with MappedReader(buf) as fh:
+                return self.parse(fh)
+
     def set_expr(self, expr: dict):
         self.expr = expr
 
@@ -43,6 +66,8 @@ class VCDParser:
             top = VCDModule()
 
         _timestamp = 0
+        update_timing_assignment = top.update_timing_assignment  # Bound once, called on every value change
+        _debug = logger.isEnabledFor(DEBUG)  # Skip building debug messages in the value change loop
 
         try:
             while True:
@@ -93,9 +118,13 @@ class VCDParser:
                         logger.debug(f' declare wire: {identifier} -> {wire} | scope: {scope}')
                         top.add_wire(wire, identifier)
 
+                elif _toc.kind == TokenKind.ENDDEFINITIONS:
+                    top.freeze_top_module()
+
                 elif _toc.kind == TokenKind.CHANGE_TIME:
                     _timestamp = _toc.data
-                    logger.debug(f'Update timestamp: {_timestamp} {top.timescale.base_unit}')
+                    if _debug:
+                        logger.debug(f'Update timestamp: {_timestamp} {top.timescale.base_unit}')
 
                 elif _toc.kind in (TokenKind.CHANGE_SCALAR, TokenKind.CHANGE_VECTOR):
                     identifier = _toc.data.id_code
@@ -103,18 +132,154 @@ class VCDParser:
 
                     if isinstance(value, str):
                         if 'x' in value or 'z' in value:
-                            logger.debug(f"Un-supported data type: '{value}', ignored due to intermediary output.")
+                            if _debug:
+                                logger.debug(f"Un-supported data type: '{value}', ignored due to intermediary output.")
                         else:
-                            logger.debug(f"\tconverting string '{value}'  to int '{int(value)}'")
+                            if _debug:
+                                logger.debug(f"\tconverting string '{value}'  to int '{int(value)}'")
                             value = int(value)
-                    top.update_timing_assignment(_timestamp, identifier, value, full=full)
+                    update_timing_assignment(_timestamp, identifier, value, full=full)
 
                 elif _toc.kind == TokenKind.CHANGE_TIME:
                     _timestamp = _toc.data
-                    logger.debug(f'[dumpvar] Update timestamp: {_timestamp} {top.timescale.base_unit}')
+                    if _debug:
+                        logger.debug(f'[dumpvar] Update timestamp: {_timestamp} {top.timescale.base_unit}')
 
                 elif _toc.kind == TokenKind.DUMPVAR:
                     continue
 
         except StopIteration:
             return top
+
+    def _parse_fast(self, buf, full: bool = False) -> VCDModule:
+        """
+        @params:
+        buf: VCD file content, such as mmap.mmap or bytes
+        full: record timing assignment for all signals in all scopes, including intermediary signals.
+        """
+        top = VCDModule()
+
+        # Header: declarations up to '$enddefinitions $end', small enough to split at once.
+        end = buf.find(b'$enddefinitions')
+        if end < 0:
+            raise VCDFormatError("Missing '$enddefinitions'")
+
+        tokens = buf[:end].split()
+        scope = None
+        i = 0
+        while i < len(tokens):
+            keyword = tokens[i]
+            try:
+                j = tokens.index(b'$end', i + 1)
+            except ValueError:
+                raise VCDFormatError(f"Un-terminated {keyword}") from None
+            args = tokens[i + 1:j]
+            i = j + 1
+
+            if keyword == b'$date':
+                top.date = b' '.join(args).decode()
+
+            elif keyword == b'$version':
+                top.version = b' '.join(args).decode()
+
+            elif keyword == b'$timescale':
+                m = _TIMESCALE_RE.fullmatch(b''.join(args))
+                if not m:
+                    raise VCDFormatError(f"Un-recognized timescale: {b' '.join(args)}")
+                _base, _unit = m.groups()
+                logger.info(f'Setting timescale: {int(_base)} {_unit.decode()}')
+                top.timescale = TimeScale(
+                    base_num=int(_base),
+                    base_unit=_unit.decode()
+                )
+
+            elif keyword == b'$scope':  # $scope module <ident> $end
+                if len(args) < 2:
+                    raise VCDFormatError(f"Un-recognized scope: {b' '.join(args)}")
+                scope = args[1].decode()
+                logger.debug(f'Enter scope: {scope}')
+                top.update_module(scope)
+
+            elif keyword == b'$upscope':
+                # 20250928 NOTE: Only export top_module
+                logger.info(f'Using reg: {", ".join(str(s) for s in top.signals)}')
+                logger.debug(f'Leaving scope: {scope}')
+                scope = None
+
+            elif keyword == b'$var':  # $var <type> <size> <id_code> <reference> [<bit_select>] $end
+                if len(args) < 4 or not args[1].isdigit():
+                    raise VCDFormatError(f"Un-recognized variable: {b' '.join(args)}")
+                _type, width, identifier, name = args[0], int(args[1]), args[2].decode(), args[3].decode()
+                if _type == b'reg':
+                    reg = Register(name=name, width=width)
+                    logger.debug(f'  declare reg: {identifier} -> {reg} | scope: {scope}')
+                    top.add_reg(reg, identifier)
+                elif _type == b'wire':
+                    # Add wire. un-used for now.
+                    wire = Wire(name=name, width=width)
+                    logger.debug(f' declare wire: {identifier} -> {wire} | scope: {scope}')
+                    top.add_wire(wire, identifier)
+
+            # Others, such as $comment, are ignored.
+
+        top.freeze_top_module()
+
+        # Value changes: dispatch on the first byte of each record.
+        _timestamp = 0
+        update_timing_assignment = top.update_timing_assignment
+        in_comment = False
+
+        pos = buf.find(b'$end', end + len(b'$enddefinitions')) + len(b'$end')
+        size = len(buf)
+        while pos < size:
+            nl = buf.find(b'\n', pos)
+            if nl < 0:
+                nl = size
+            records = buf[pos:nl].split()
+            pos = nl + 1
+
+            k = 0
+            while k < len(records):
+                rec = records[k]
+                c = rec[0]
+                k += 1
+
+                if in_comment:
+                    in_comment = rec != b'$end'
+
+                elif c == 35:  # '#<timestamp>'
+                    if not rec[1:].isdigit():
+                        raise VCDFormatError(f"Un-recognized timestamp: {rec}")
+                    _timestamp = int(rec[1:])
+
+                elif c == 48 or c == 49:  # '0<id_code>', '1<id_code>'
+                    update_timing_assignment(_timestamp, rec[1:].decode(), c - 48, full=full)
+
+                elif c == 98 or c == 66:  # 'b<value> <id_code>'
+                    bits = rec[1:].lower()
+                    if k == len(records):
+                        raise VCDFormatError(f"Missing id_code after: {rec}")
+                    identifier = records[k].decode()
+                    k += 1
+                    if b'x' in bits or b'z' in bits:
+                        update_timing_assignment(_timestamp, identifier, bits.decode(), full=full)
+                    else:
+                        try:
+                            value = int(bits, 2)
+                        except ValueError:
+                            raise VCDFormatError(f"Un-recognized vector value: {rec}") from None
+                        update_timing_assignment(_timestamp, identifier, value, full=full)
+
+                elif c in b'xXzZ':  # 'x<id_code>', 'z<id_code>'
+                    update_timing_assignment(_timestamp, rec[1:].decode(), chr(c).lower(), full=full)
+
+                elif c == 114 or c == 82:  # 'r<real> <id_code>', un-supported
+                    k += 1
+
+                elif c == 36:  # Such as: $dumpvars, $dumpall, $end
+                    in_comment = rec == b'$comment'
+
+                else:
+                    raise VCDFormatError(f"Un-recognized value change record: {rec}")
+
+        return top
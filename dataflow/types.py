@@ -9,15 +9,36 @@
 #################################
 import re
 import sys
-from logging import getLogger
-from typing import Tuple, Dict, List
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger, DEBUG
+from typing import Tuple, Dict, List, TextIO, Union, Iterable
 import numpy as np
 from dataclasses import dataclass, field
-from .helper import eval_expr
+from .helper import format_time_ns, format_time_expr
 
 logger = getLogger('main')
 
 TIMESCALE_ROUNDING = 3
+_BSTR_RE = re.compile(r'^b?(\d+)', re.ASCII)  # Binary value string, such as: b1110111
+
+
+def _bit_rows(values: np.ndarray, width: int) -> Iterable[np.ndarray]:
+    """
+    Time series of each bit, MSB -> LSB: row m is bit (width - 1 - m).
+
+    Rows are yielded one bit at a time with a single shift, so the full
+    width x N bit matrix is never materialized.
+    """
+    one = values.dtype.type(1)
+    return (((values >> values.dtype.type(shift)) & one).astype(np.int8) for shift in range(width - 1, -1, -1))
+
+
+def _find_transitions(bit_row: np.ndarray) -> np.ndarray:
+    """
+    Indices of true transitions in a bit time series. Index 0 is always flagged, for the initial value.
+    """
+    return np.flatnonzero(np.diff(bit_row, prepend=-1))
 
 
 @dataclass
@@ -27,30 +48,47 @@ class TimeScale:
 
     def __post_init__(self):
         self._unit_conversion = {
+            's': 1,
             'ms': 1e3,
             'us': 1e6,
             'ns': 1e9,
-            'ps': 1e12
+            'ps': 1e12,
+            'fs': 1e15
+        }
+        if self.base_unit not in self._unit_conversion:
+            raise ValueError(f"Un-supported timescale unit: {self.base_unit}")
+        # Multiplier from base unit to each target unit, computed once.
+        self._mul_cache = {
+            unit: self._unit_conversion[unit] / self._unit_conversion[self.base_unit]
+            for unit in self._unit_conversion
         }
 
     def __repr__(self):
         return f"{self.base_num}{self.base_unit}"
 
     def convert_to(self, timestamp: int, unit: str='ns'):
-        _mul = self._unit_conversion.get(unit) / self._unit_conversion.get(self.base_unit)
-        _value = round(float(timestamp * _mul), TIMESCALE_ROUNDING)
+        _value = round(float(timestamp * self._mul_cache[unit]), TIMESCALE_ROUNDING)
         return _value
 
+    def convert_to_array(self, timestamps: np.ndarray, unit: str='ns') -> np.ndarray:
+        return np.round(timestamps.astype(np.float64) * self._mul_cache[unit], TIMESCALE_ROUNDING)
 
-@dataclass
+
+@dataclass(slots=True)
 class Register:
     name: str
     width: int = 1  # Bus, such as: output reg [7:0] RTSEL (verilog)
     dim: int = 0  # 2-D array, such as: output reg [8:0] WEM[31:0]  (verilog)
+    # NOTE: slots=True, so every attribute set in __post_init__ must be declared here.
+    export_pwl_safe: bool = field(init=False, repr=False, compare=False)
+    _ts_list: array = field(init=False, repr=False, compare=False)
+    _val_list: Union[array, List[int]] = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
-        self.data = np.zeros(self.width)  # Perhaps not used.
-        self.timing_assignments: Dict[float, np.ndarray] = {}  # Default unit: 1ns
+        # Timing assignments, stored as compact columns: timestamp (base unit) -> register value
+        # NOTE: Buses wider than 64 bits fall back to a list of python int.
+        self._ts_list = array('q')
+        self._val_list = array('Q') if self.width <= 64 else []
         self.export_pwl_safe = True
 
     def tag(self, x_state: bool=False):
@@ -65,19 +103,28 @@ class Register:
     def __str__(self):
         return self.__repr__()
 
-    def update(self, timestamp: int, value: int):
-        # data = self.str2bit_array(value)
+    @property
+    def timestamps(self) -> np.ndarray:
+        return np.array(self._ts_list, dtype=np.int64)
 
-        # # Pad the values
-        # if len(data) < self.width:
-        #     # Pad w/ zeros if necessary
-        #     data = np.pad(data, (self.width - len(data), 0), 'constant')
-        bit_value = self.int2bit_array(value)
+    @property
+    def values(self) -> np.ndarray:
+        return np.array(self._val_list, dtype=np.uint64 if self.width <= 64 else object)
+
+    def update(self, timestamp: int, value: int):
+        if value >> self.width:
+            raise ValueError(f"Value {value} requires more than {self.width} bits.")
 
         # Update timing assignment
-        logger.debug(f"Update assignment for {self.name:<20} | {timestamp}: {''.join(bit_value.astype(str))}")
-        self.timing_assignments[timestamp] = bit_value
-        self.data = bit_value
+        if logger.isEnabledFor(DEBUG):
+            logger.debug(f"Update assignment for {self.name:<20} | {timestamp}: {value:0{self.width}b}")
+        if self._ts_list and self._ts_list[-1] == timestamp:
+            self._val_list[-1] = value  # Re-assignment at the same timestamp
+        elif self._val_list and self._val_list[-1] == value:
+            return  # Skip on no-value update, only value changes are kept.
+        else:
+            self._ts_list.append(timestamp)
+            self._val_list.append(value)
 
     def int2bit_array(self, value: int):
         """
@@ -86,83 +133,77 @@ class Register:
         if value.bit_length() > self.width:
             raise ValueError(f"Value {value} requires more than {self.width} bits.")
 
-        bits = np.zeros(self.width, dtype=np.int8)
-        for i in range(self.width):
-            bits[self.width - 1 - i] = (value >> i) & 1
+        buf = value.to_bytes((self.width + 7) >> 3, 'big')
+        bits = np.unpackbits(np.frombuffer(buf, dtype=np.uint8))
 
-        return bits
+        return bits[-self.width:].astype(np.int8, copy=False)
 
     @staticmethod
     def str2bit_array(value_str: str):
         """
         b1110111 -> numpy.array
         """
-        regex = r'^b?(\d+)'
-        if not re.match(regex, value_str):
+        m = _BSTR_RE.match(value_str)
+        if not m:
             raise ValueError("Failed to convert string to bit_array")
 
-        else:
-            binary_str, = re.match(regex, value_str).groups()
-
-            return np.array([int(s) for s in binary_str])
+        binary_str = m.group(1)
+        return np.frombuffer(binary_str.encode('ascii'), dtype=np.uint8) - ord('0')
 
     def generate_piecewise_linear(self, timescale: TimeScale, expr: dict) -> str:
         if not self.export_pwl_safe:
             logger.info(f"Skipging piece-wise linear for x-state signal: {self.__str__()}")
             return ""
 
-        lines = ""
-        for data_idx, x in np.ndenumerate(self.data):
-            if len(data_idx) > 1:  # 2-D Vector - TODO: Test 2-D Vector
-                n, m = data_idx
-                pwl_name = f"{self.name}{self.dim - 1 - n}[{self.width - 1 - m}]"  # MSB -> LSB
-            elif len(data_idx) == 1 and self.width > 1:  # 1-D Bus
-                m, = data_idx
+        timestamps = self.timestamps
+        values = self.values
+        t_arr = timescale.convert_to_array(timestamps, unit='ns').tolist()  # TODO: Use global unit
+
+        # Loop invariant: rise/fall parameter of this signal, and whether to emit the 't + trf' clause.
+        rf_identifier = 'tcrf' if self.name == 'CLK' else 'trf'
+        use_rf = expr.get(rf_identifier) == 0
+
+        parts = []  # PWL fragments, joined once at the end
+        for m, row in enumerate(_bit_rows(values, self.width)):  # TODO: 2-D Vector, naming as f"{self.name}{n}[{bit_idx}]"
+            if self.width > 1:  # 1-D Bus
                 # NOTE: index is reversed as MSB/LSB
                 bit_idx = self.width - 1 - m  # Convert MSB -> LSB
                 pwl_name = f"{self.name}[{bit_idx}]"
             else:
                 pwl_name = f"{self.name}"
 
-            line = f"V{pwl_name} {pwl_name} 0 pwl("
+            parts.append(f"V{pwl_name} {pwl_name} 0 pwl(")
+
+            changes = _find_transitions(row)
 
             _prev = 'na'  # Previous value
-            for idx, (_timestamp, bit_value) in enumerate(self.timing_assignments.items()):
-                # if len(data_idx) > 1:  # 2-D Vector - NOT USED
-                #     (n, m) = data_idx
-                #     crnt_v = 'vvdd' if v[n][m] else '0'
-                crnt_v = 'vvdd' if bit_value[data_idx] else '0'
+            for idx in changes.tolist():
+                crnt_v = 'vvdd' if row[idx] else '0'
 
                 if _prev == 'na':  # @ t0, use initial value
-                    line += f"0 {crnt_v}\n+"
-                elif _prev != crnt_v:  # NOTE: signal previous value, if changes, add a 't + trf' clause
-                    rf_identifier = 'tcrf' if self.name == 'CLK' else 'trf'
-                    t = timescale.convert_to(_timestamp, unit='ns') # This returns a float # TODO: Use global unit
-                    t_expr = eval_expr(t, base=1, unit='ns')
-
-                    if expr.get(rf_identifier) == 0:
-                        t_rf = eval_expr(f'{t} + {rf_identifier}', base=1, unit='ns')
-                        line += f"'{t_expr}' {_prev} '{t_rf}' {crnt_v} "
+                    parts.append(f"0 {crnt_v}\n+")
+                else:  # NOTE: signal previous value, if changes, add a 't + trf' clause
+                    t = t_arr[idx]  # This is a float
+                    t_expr = format_time_ns(t)
+
+                    if use_rf:
+                        t_rf = format_time_expr(t, rf_identifier)
+                        parts.append(f"'{t_expr}' {_prev} '{t_rf}' {crnt_v} ")
                     else:
-                        line += f"'{t_expr}' {crnt_v} "
-
-                else:
-                    pass  # Skip on no-value update.
+                        parts.append(f"'{t_expr}' {crnt_v} ")
 
                 _prev = crnt_v
-            line += ')\n\n'
-            lines += line
+            parts.append(')\n\n')
 
-        return lines
+        return ''.join(parts)
 
-@dataclass
+@dataclass(slots=True)
 class Wire(Register):
     name: str
     width: int = 1  # Bus, such as: output reg [7:0] RTSEL (verilog)
     dim: int = 0  # 2-D array, such as: output reg [8:0] WEM[31:0]  (verilog)
 
-    def __post_init__(self):
-        super().__post_init__()
+    # NOTE: __post_init__ is inherited. Zero-argument super() is not usable in slots dataclasses.
 
     def __repr__(self) -> str:
         if self.width == 1:
@@ -173,27 +214,45 @@ class Wire(Register):
     def __str__(self):
         return self.__repr__()
 
+def _reg_to_pwl(args: Tuple[Register, TimeScale, dict]) -> str:
+    """
+    Worker for parallel Module.export_pwl, at module level so it can be pickled.
+    """
+    reg, timescale, expr = args
+    return reg.generate_piecewise_linear(timescale=timescale, expr=expr)
+
 @dataclass
 class Module:  # scope definition w/ $scope & $upscope
     name: str
     variables: Dict[str, Register] = field(default_factory=dict)  # Tuple[str, (reg/wire)
+    signals: List[Register] = field(default_factory=list)  # Same registers, in export order
 
     def add_signal(self, _identifier: str, reg: Register):
+        if _identifier in self.variables:  # Re-declared identifier, keep its export position.
+            _old = self.variables[_identifier]
+            self.signals[next(i for i, r in enumerate(self.signals) if r is _old)] = reg
+        else:
+            self.signals.append(reg)
         self.variables[_identifier] = reg
 
-    def export_pwl(self, timescale: TimeScale, expr: dict):
+    def export_pwl(self, fh: TextIO, timescale: TimeScale, expr: dict, jobs: int = 1) -> None:
+        """
+        Write piece-wise linear of each signal to an open file handle.
+
+        With jobs > 1, signals are generated in a process pool. Output order is preserved.
+        """
         logger.info(f"\tmodule: {self.name} | vars: {self.variables.keys()}")
-        data = ''
-        for _identifier, reg in self.variables.items():
-            if isinstance(reg, Register):
-                logger.info(f'Generate piece-wise linear for {reg}')
-                data += reg.generate_piecewise_linear(timescale=timescale, expr=expr) + '\n'
-            elif isinstance(reg, Wire):
-                logger.info(f'Generate piece-wise linear for wire {reg}')
-                data += reg.generate_piecewise_linear(timescale=timescale, expr=expr) + '\n'
-            else:
-                logger.fatal("Un-reachable code.")
-        return data
+        if jobs > 1:
+            args = [(reg, timescale, expr) for reg in self.signals]
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for reg, pwl in zip(self.signals, executor.map(_reg_to_pwl, args)):
+                    logger.info(f'Generate piece-wise linear for {reg}')
+                    fh.write(pwl + '\n')
+            return
+
+        for reg in self.signals:  # NOTE: Wire inherits generate_piecewise_linear from Register.
+            logger.info(f'Generate piece-wise linear for {reg}')
+            fh.write(reg.generate_piecewise_linear(timescale=timescale, expr=expr) + '\n')
 
 @dataclass
 class VCDModule:
@@ -207,6 +266,8 @@ class VCDModule:
 
     def __post_init__(self):
         self._sig_map = {}  # For unique identifier mapping, such as ! -> AA, " -> AB
+        self._top_ids = frozenset()  # Top module identifiers, see freeze_top_module()
+        self._top_vars_get = None
 
     def add_reg(self, reg: Register, _identifier: str) -> None:
         self._sig_map[_identifier] = reg.name
@@ -232,21 +293,27 @@ class VCDModule:
             logger.warning(f"Repeated scope entry: {scope}. Please check vcd file.")
 
     def is_reg_top_module(self, ident: str) -> bool:
-        return ident in self.module.variables.keys()
+        return ident in self._top_ids  # Valid after freeze_top_module()
 
-    def update_timing_assignment(self, timestamp: int, _identifier: str, value: int, full: bool = False):
-        # Skip intermediary signals.
-        if not full and not self.is_reg_top_module(_identifier):
-            return
+    def freeze_top_module(self) -> None:
+        """
+        Snapshot top module identifiers once all declarations are parsed, i.e. at $enddefinitions.
+        Value changes are then filtered with a single set lookup.
+        """
+        self._top_ids = frozenset(self.module.variables)
+        self._top_vars_get = self.module.variables.__getitem__
 
-        time_value = self.timescale.convert_to(timestamp, 'ns')  # TODO:
-        _reg = self.module.variables.get(_identifier)
+    def update_timing_assignment(self, timestamp: int, _identifier: str, value: int, full: bool = False):
+        if _identifier not in self._top_ids:
+            if not full:
+                return  # Skip intermediary signals.
 
-        if not _reg:
             logger.error(f'un-recognized identifier: {_identifier}, not top_module: {self.module.variables.keys()}')
             logger.error(f'current module: {self.current_module}')
             sys.exit(-1)
 
+        _reg = self._top_vars_get(_identifier)
+
         # NOTE: Check if value is integer, if 'x' & 'z' then ignore timing assignment, FOR NOW.
         if isinstance(value, str):
             logger.warning(f"\t{_reg}: Skipping ambiguous signal value definition, during update timing assignment: {value}")
@@ -254,9 +321,11 @@ class VCDModule:
             return
 
         _reg.update(timestamp=timestamp, value=value)
-        logger.debug(f"Setting {_reg.name} to '{value}' at time: {time_value}")
+        if logger.isEnabledFor(DEBUG):
+            time_value = self.timescale.convert_to(timestamp, 'ns')  # TODO:
+            logger.debug(f"Setting {_reg.name} to '{value}' at time: {time_value}")
 
-    def export_pwl(self, output_filepath: str, expr: dict) -> None:
+    def export_pwl(self, output_filepath: str, expr: dict, jobs: int = 1) -> None:
         # NOTE: Defaults to export top pwl only.
         with open(output_filepath, 'w') as f:
-            f.write(self.module.export_pwl(timescale=self.timescale, expr=expr))
+            self.module.export_pwl(f, timescale=self.timescale, expr=expr, jobs=jobs)
@@ -15,6 +15,7 @@ import colorlog
 from pathlib import Path
 from dataflow.types import *
 from dataflow.parser import VCDParser
+from dataflow.helper import map_file
 
 
 def setup_logger(log_file=f'vcd2pwl.log', level=logging.INFO):
@@ -45,7 +46,8 @@ logger = setup_logger()
 @click.option('--output_file', '-o', nargs=1, required=False, default=None, help='Specify output filepath.')
 @click.option('--trf', nargs=1, required=False, default=0, help='Transition rise/fall time for signals.')
 @click.option('--tcrf', nargs=1, required=False, default=0, help='Transition rise/fall time for CLK signal.')
-def dump(debug: bool, input_file: str, output_file: str, trf: int, tcrf: int):
+@click.option('--jobs', '-j', nargs=1, required=False, default=1, help='Number of processes to generate piece-wise linear.')
+def dump(debug: bool, input_file: str, output_file: str, trf: int, tcrf: int, jobs: int):
     """
     A command-line tool to convert Value Change Dump to Piece-Wise Linear for SPICE.
 
@@ -74,10 +76,10 @@ def dump(debug: bool, input_file: str, output_file: str, trf: int, tcrf: int):
             "tcrf": tcrf
     }
 
-    with open(input_file, 'rb') as f:
-        vcd = parser.parse(f)
+    with map_file(input_file) as mm:
+        vcd = parser.parse_fast(mm)
 
-    vcd.export_pwl(output_file, expr=expr)
+    vcd.export_pwl(output_file, expr=expr, jobs=jobs)
     logger.info(f'Generate piece-wise linear under: {output_file}')
 
 if __name__ == "__main__":
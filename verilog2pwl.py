@@ -16,7 +16,7 @@ import colorlog
 from pathlib import Path
 from dataflow.types import *
 from dataflow.parser import VCDParser
-from dataflow.helper import parse_ast, run_command, safe_get_module_top
+from dataflow.helper import parse_ast, run_command, safe_get_module_top, map_file
 from pyverilog.vparser.parser import ParseError
 
 def setup_logger(log_file=f'verilog2pwl.log', level=logging.INFO):
@@ -44,7 +44,9 @@ def setup_logger(log_file=f'verilog2pwl.log', level=logging.INFO):
 @click.option('--output_file', '-o', nargs=1, required=False, default=None, help='Specify output filepath.')
 @click.option('--trf', nargs=1, required=False, default=0, help='Transition rise/fall time for signals.')
 @click.option('--tcrf', nargs=1, required=False, default=0, help='Transition rise/fall time for CLK signal.')
-def dump(debug: bool, input_file: str, output_file: str, trf: int, tcrf: int):
+@click.option('--jobs', '-j', nargs=1, required=False, default=1, help='Number of processes to generate piece-wise linear.')
+@click.option('--full-ast/--no-full-ast', default=False, help="Parse module top from the full AST with 'pyverilog'.")
+def dump(debug: bool, input_file: str, output_file: str, trf: int, tcrf: int, jobs: int, full_ast: bool):
     """
     A command-line tool to convert Verilog Testbench to Piece-Wise Linear for SPICE.
 
@@ -62,12 +64,16 @@ def dump(debug: bool, input_file: str, output_file: str, trf: int, tcrf: int):
         logger.error('Not a verilog file.')
         sys.exit(-1)
 
-    try:
-        ast, module_top = parse_ast([input_file])  # NOTE: Could be a list of files.
-    except ParseError as e:
-        logger.warning(f"Unable to parse input file with 'pyverilog' module: {e}")
-        module_top = safe_get_module_top(input_file)  # Temp-workaround
-        logger.info(f"Conservatively using module_top: {module_top}")
+    if full_ast:
+        try:
+            ast, module_top = parse_ast([input_file])  # NOTE: Could be a list of files.
+        except ParseError as e:
+            logger.warning(f"Unable to parse input file with 'pyverilog' module: {e}")
+            module_top = safe_get_module_top(input_file)  # Temp-workaround
+            logger.info(f"Conservatively using module_top: {module_top}")
+    else:
+        module_top = safe_get_module_top(input_file)  # Only the top module name is needed.
+        logger.info(f"Using module_top: {module_top}")
 
     if not output_file:
         output_file = f'{module_top}.pwl'
@@ -92,11 +98,11 @@ def dump(debug: bool, input_file: str, output_file: str, trf: int, tcrf: int):
     }
 
     vcd_file = f'{file_dir}/{module_top}.vcd'
-    with open(vcd_file, 'rb') as f:
-        vcd = parser.parse(f)
+    with map_file(vcd_file) as mm:
+        vcd = parser.parse_fast(mm)
 
     # Dump pwl
-    vcd.export_pwl(output_file, expr=expr)
+    vcd.export_pwl(output_file, expr=expr, jobs=jobs)
     logger.info(f'Generate piece-wise linear under: {output_file}')
 
 